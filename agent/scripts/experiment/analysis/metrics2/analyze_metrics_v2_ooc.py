@@ -0,0 +1,500 @@
+
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+import numpy as np
+
+import check_embedding_store
+from vector_store import load_store, temp_path
+
+# Out-of-core version of analyze_metrics_v2.ts.
+# Vectors are streamed once from vectors.jsonl into a row-major .npy store
+# (vector_store.py), then the upper triangle of the similarity matrix is
+# processed block by block so that only two row blocks (plus one prefetched
+# block) are ever in memory.
+#
+# Usage: python analyze_metrics_v2_ooc.py <data.jsonl> ... [--limit 100] [--block-size 4096] [--in-memory]
+#
+# Multi-node: every node runs one block-row range of the upper triangle and
+# writes a partial file into a shared directory; --merge combines them.
+# --plan-shards builds vectors.npy once; --shard only opens that store and
+# never rebuilds it.
+#   python analyze_metrics_v2_ooc.py --plan-shards 4 <data.jsonl>
+#   python analyze_metrics_v2_ooc.py --shard 0:12 --partial-dir /shared/partials <data.jsonl>
+#   python analyze_metrics_v2_ooc.py --merge --partial-dir /shared/partials <data.jsonl>
+#
+# Before any pairs are computed the store goes through check_embedding_store.py;
+# runs that fail (mixed dimensions, bad norms, duplicates, probe disagreement)
+# get no metrics file. --skip-check bypasses this, but --merge only accepts
+# partials whose shard passed the check.
+
+NUM_BINS = 100
+DEFAULT_BLOCK_SIZE = 4096
+OUTPUT_FILENAME = "similarity_metrics_v2.json"
+PARTIAL_PREFIX = "similarity_partial_v2"
+
+
+# --- Blocks ---
+
+def read_block(store, block_size, index):
+    start = index * block_size
+    block = np.array(store[start:start + block_size], dtype=np.float64)
+
+    # Row-normalize so that a dot product is the cosine similarity.
+    # Zero vectors stay zero, matching cosineSimilarity() returning 0.
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    np.divide(block, norms, out=block, where=norms > 0)
+    return block
+
+
+# --- Block Scheduling ---
+
+def block_pair_schedule(num_blocks, row_start=0, row_end=None):
+    # Upper-triangle block pairs (i, j >= i) in serpentine order:
+    # even rows sweep j forward, odd rows sweep j backward, so the column block
+    # at the end of one row is still resident at the start of the next.
+    # row_start/row_end restrict the schedule to one shard of block rows.
+    if row_end is None:
+        row_end = num_blocks
+    schedule = []
+    for i in range(row_start, row_end):
+        cols = range(i, num_blocks)
+        if i % 2 == 1:
+            cols = reversed(cols)
+        for j in cols:
+            schedule.append((i, j))
+    return schedule
+
+
+def plan_shards(num_blocks, num_shards):
+    # Contiguous block-row ranges with roughly equal numbers of block pairs.
+    # Row i owns (num_blocks - i) pairs, so early shards get fewer rows.
+    total_pairs = num_blocks * (num_blocks + 1) // 2
+    shards = []
+    row = 0
+    done_pairs = 0
+    for k in range(num_shards):
+        target = total_pairs * (k + 1) / num_shards
+        start = row
+        while row < num_blocks and (done_pairs < target or row == start):
+            done_pairs += num_blocks - row
+            row += 1
+        if k == num_shards - 1:
+            row = num_blocks
+        if start < row:
+            shards.append((start, row))
+    return shards
+
+
+def parse_shard_spec(spec):
+    try:
+        start, end = (int(x) for x in spec.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard spec '{spec}', expected START:END block rows")
+    if start < 0 or end <= start:
+        raise argparse.ArgumentTypeError(f"Invalid shard range '{spec}'")
+    return (start, end)
+
+
+def plan_block_reads(schedule):
+    # Replays the schedule against a two-slot cache and returns the order in
+    # which blocks must be read from disk. run_schedule() uses the same rules.
+    resident = []
+    reads = []
+    for i, j in schedule:
+        for b in (i, j):
+            if b not in resident:
+                resident = [r for r in resident if r in (i, j)] + [b]
+                reads.append(b)
+    return reads
+
+
+class BlockPrefetcher:
+    # Double buffering: while the main thread computes on the resident blocks,
+    # a background thread reads the next block of the plan into a 1-slot queue.
+
+    PUT_TIMEOUT = 0.1
+    THREAD_NAME = "block-prefetch"
+
+    def __init__(self, store, block_size, reads):
+        self._queue = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+        self._store = store
+        self._block_size = block_size
+        self._reads = reads
+        self._thread = threading.Thread(target=self._run, name=self.THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # Retry with a timeout so an abandoned consumer can't block us forever
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=self.PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            for index in self._reads:
+                if self._stop.is_set():
+                    return
+                if not self._put((index, read_block(self._store, self._block_size, index))):
+                    return
+        except Exception as e:
+            self._put((None, e))
+
+    def next(self, expected_index):
+        index, block = self._queue.get()
+        if index is None:
+            raise block
+        if index != expected_index:
+            raise RuntimeError(f"Prefetch order mismatch: expected block {expected_index}, got {index}")
+        return block
+
+    def close(self):
+        # Normal path: every planned block has been consumed, the thread is done
+        self._thread.join()
+
+    def abort(self):
+        # Error path: stop the producer and free the slot it may be waiting on
+        self._stop.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join(timeout=5 * self.PUT_TIMEOUT)
+
+
+class SyncBlockReader:
+    def __init__(self, store, block_size):
+        self._store = store
+        self._block_size = block_size
+
+    def next(self, expected_index):
+        return read_block(self._store, self._block_size, expected_index)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+# --- Accumulator ---
+
+class PairwiseAccumulator:
+    # Partial statistics over a set of pairs. Count/mean/M2 are combined with
+    # Chan et al.'s parallel update; histogram bins add, NN maxima take the max.
+
+    def __init__(self, num_rows):
+        self.num_rows = num_rows
+        self.pair_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = np.zeros(NUM_BINS, dtype=np.int64)
+        self.nn_max = np.full(num_rows, -np.inf, dtype=np.float64)
+
+    def add_values(self, values):
+        n = values.size
+        if n == 0:
+            return
+        block_mean = float(values.mean())
+        block_m2 = float(np.square(values - block_mean).sum())
+        self._merge_moments(n, block_mean, block_m2)
+
+        # Histogram (100 buckets: 0.00-0.01, ..., 0.99-1.00), negatives clamp to bucket 0
+        buckets = np.minimum(np.floor(np.maximum(values, 0.0) * NUM_BINS), NUM_BINS - 1).astype(np.int64)
+        self.histogram += np.bincount(buckets, minlength=NUM_BINS)
+
+    def update_nn(self, start, row_max):
+        segment = self.nn_max[start:start + row_max.size]
+        np.maximum(segment, row_max, out=segment)
+
+    def merge(self, other):
+        if other.num_rows != self.num_rows:
+            raise ValueError(f"Cannot merge accumulators over {self.num_rows} and {other.num_rows} rows")
+        self._merge_moments(other.pair_count, other.mean, other.m2)
+        self.histogram += other.histogram
+        np.maximum(self.nn_max, other.nn_max, out=self.nn_max)
+        return self
+
+    def save_partial(self, path, meta):
+        # Written to a temporary name first so --merge never sees half a file
+        tmp_path = f"{temp_path(path)}.npz"
+        np.savez(
+            tmp_path,
+            meta=json.dumps(meta),
+            pair_count=self.pair_count,
+            mean=self.mean,
+            m2=self.m2,
+            histogram=self.histogram,
+            nn_max=self.nn_max,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_partial(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            acc = cls(int(data['nn_max'].size))
+            acc.pair_count = int(data['pair_count'])
+            acc.mean = float(data['mean'])
+            acc.m2 = float(data['m2'])
+            acc.histogram = data['histogram'].astype(np.int64)
+            acc.nn_max = data['nn_max'].astype(np.float64)
+        return acc, meta
+
+    def _merge_moments(self, n_b, mean_b, m2_b):
+        if n_b == 0:
+            return
+        n_a = self.pair_count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * n_a * n_b / n
+        self.pair_count = n
+
+    def to_result(self, filename):
+        nn = self.nn_max[np.isfinite(self.nn_max)]
+        return {
+            "filename": filename,
+            "count": self.num_rows,
+            "averageSimilarity": self.mean if self.pair_count > 0 else 0,
+            "varianceSimilarity": self.m2 / self.pair_count if self.pair_count > 0 else 0,
+            "similarityDistribution": self.histogram.tolist() if self.pair_count > 0 else [],
+            "nearestNeighborAvg": float(nn.mean()) if nn.size > 0 else 0,
+        }
+
+
+# --- Analysis Logic ---
+
+def accumulate_block_pair(acc, block_i, block_j, i, j, block_size):
+    sims = block_i @ block_j.T
+    if i == j:
+        # Diagonal block: only strict upper triangle counts as pairs,
+        # and self-similarity must not be picked as a nearest neighbor.
+        iu = np.triu_indices(sims.shape[0], k=1)
+        acc.add_values(sims[iu])
+        np.fill_diagonal(sims, -np.inf)
+        acc.update_nn(i * block_size, sims.max(axis=1))
+    else:
+        acc.add_values(sims.ravel())
+        acc.update_nn(i * block_size, sims.max(axis=1))
+        acc.update_nn(j * block_size, sims.max(axis=0))
+
+
+def run_schedule(store, block_size, schedule, prefetch=True):
+    acc = PairwiseAccumulator(store.shape[0])
+    reads = plan_block_reads(schedule)
+    reader = BlockPrefetcher(store, block_size, reads) if prefetch else SyncBlockReader(store, block_size)
+
+    resident = {}
+    try:
+        for i, j in schedule:
+            for b in (i, j):
+                if b not in resident:
+                    resident = {r: blk for r, blk in resident.items() if r in (i, j)}
+                    resident[b] = reader.next(b)
+            accumulate_block_pair(acc, resident[i], resident[j], i, j, block_size)
+    except BaseException:
+        reader.abort()
+        raise
+    reader.close()
+
+    print(f"  -> Processed {len(schedule)} block pairs with {len(reads)} block reads.")
+    return acc
+
+
+def result_filename(file_path):
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    return f"{os.path.basename(dir_path)}/{os.path.basename(file_path)}"
+
+
+def partial_path(partial_dir, run_name, shard):
+    return os.path.join(partial_dir, f"{PARTIAL_PREFIX}_{run_name}_rows{shard[0]}-{shard[1]}.npz")
+
+
+def analyze_file(file_path, limit, block_size, in_memory=False, shard=None, reuse_store=False, check=None):
+    # Returns (accumulator, check_passed). The accumulator is None when the
+    # store can't be loaded or the embedding check fails, so no metrics get
+    # written; check_passed is True only if the check actually ran and passed.
+    # check: None to skip, otherwise {"run": check_run, "probe_path": ..., "expected_dim": ..., "thresholds": ...}
+    print(f"\nAnalyzing: {os.path.basename(file_path)} (Limit: {limit if limit > 0 else 'All'}, Block: {block_size})")
+
+    try:
+        store = load_store(file_path, limit, in_memory, reuse_store, build=shard is None)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return None, False
+    if store is None:
+        return PairwiseAccumulator(0), False
+
+    count = store.shape[0]
+    num_blocks = (count + block_size - 1) // block_size
+    row_start, row_end = shard if shard else (0, num_blocks)
+    if row_end > num_blocks:
+        # Validated before the embedding check so a bad spec fails fast
+        print(f"--shard {row_start}:{row_end} exceeds the {num_blocks} block rows of this run")
+        sys.exit(1)
+
+    check_passed = False
+    if check is not None:
+        report = check["run"](file_path, store, check["probe_path"], check["expected_dim"], check["thresholds"])
+        if not report["passed"]:
+            return None, False
+        check_passed = True
+
+    if count < 2:
+        return PairwiseAccumulator(count), check_passed
+
+    schedule = block_pair_schedule(num_blocks, row_start, row_end)
+    return run_schedule(store, block_size, schedule, prefetch=not in_memory), check_passed
+
+
+def merge_partials(file_path, partial_dir):
+    # Combines every partial of one run. Shards must tile block rows
+    # 0..num_blocks exactly once with the same count and block size.
+    run_name = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+    prefix = f"{PARTIAL_PREFIX}_{run_name}_rows"
+    paths = sorted(
+        os.path.join(partial_dir, name) for name in os.listdir(partial_dir)
+        if name.startswith(prefix) and name.endswith('.npz') and '.tmp-' not in name
+    )
+    if not paths:
+        raise FileNotFoundError(f"No partial results for {run_name} in {partial_dir}")
+
+    partials = [PairwiseAccumulator.load_partial(p) for p in paths]
+    partials.sort(key=lambda item: item[1]['rowStart'])
+
+    first_meta = partials[0][1]
+    unchecked = [f"{m['rowStart']}:{m['rowEnd']}" for _, m in partials if not m.get('checkPassed')]
+    if unchecked:
+        raise ValueError(f"Partials {', '.join(unchecked)} did not pass the embedding check; refusing to merge")
+
+    expected_row = 0
+    for acc, meta in partials:
+        if meta['count'] != first_meta['count'] or meta['blockSize'] != first_meta['blockSize']:
+            raise ValueError(f"Partial {meta['rowStart']}:{meta['rowEnd']} was computed with different count/block size")
+        if meta['rowStart'] != expected_row:
+            raise ValueError(f"Block rows {expected_row}:{meta['rowStart']} are missing or overlap")
+        expected_row = meta['rowEnd']
+    if expected_row != first_meta['numBlocks']:
+        raise ValueError(f"Block rows {expected_row}:{first_meta['numBlocks']} are missing")
+
+    merged = PairwiseAccumulator(first_meta['count'])
+    for acc, _ in partials:
+        merged.merge(acc)
+    print(f"  -> Merged {len(partials)} partial results for {run_name}.")
+    return merged
+
+
+def write_result(file_path, result):
+    input_dir = os.path.dirname(os.path.abspath(file_path))
+    output_json_path = os.path.join(input_dir, OUTPUT_FILENAME)
+
+    with open(output_json_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+
+    print(f"✅ Saved metrics to: {output_json_path}")
+    print(f"   Count: {result['count']}")
+    print(f"   Avg Sim: {result['averageSimilarity']:.4f}")
+    print(f"   NN Avg:  {result['nearestNeighborAvg']:.4f}")
+
+
+# --- Main ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-core pairwise similarity metrics (v2).")
+    parser.add_argument('files', nargs='+', help="data.jsonl files; vectors.jsonl is read from the same directory")
+    parser.add_argument('--limit', type=int, default=0)
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument('--in-memory', action='store_true', help="load the whole store into RAM (reference path)")
+    parser.add_argument('--shard', type=parse_shard_spec, help="block-row range START:END of the upper triangle")
+    parser.add_argument('--partial-dir', help="shared directory for partial results (default: run directory)")
+    parser.add_argument('--merge', action='store_true', help="merge partial results into similarity_metrics_v2.json")
+    parser.add_argument('--plan-shards', type=int, metavar='N', help="print N balanced shard specs and exit")
+    parser.add_argument('--reuse-store', action='store_true', help="reuse an existing vectors.npy instead of rebuilding (always on for --shard)")
+    parser.add_argument('--skip-check', action='store_true', help="do not run the embedding consistency check")
+    parser.add_argument('--probes', help="reference probe vectors for the embedding check")
+    parser.add_argument('--expected-dim', type=int, help="expected embedding dimension for the embedding check")
+    check_embedding_store.add_threshold_arguments(parser)
+    args = parser.parse_args()
+
+    if args.block_size < 1:
+        print("--block-size must be positive")
+        sys.exit(1)
+    if args.merge and args.shard:
+        print("--merge and --shard are mutually exclusive")
+        sys.exit(1)
+
+    check = None
+    if not args.skip_check:
+        check = {
+            "run": check_embedding_store.check_run,
+            "probe_path": args.probes or check_embedding_store.default_probe_path(),
+            "expected_dim": args.expected_dim or check_embedding_store.EXPECTED_DIM,
+            "thresholds": check_embedding_store.thresholds_from_args(args),
+        }
+
+    failed = False
+    for file_path in args.files:
+        run_dir = os.path.dirname(os.path.abspath(file_path))
+        partial_dir = args.partial_dir or run_dir
+
+        if args.plan_shards:
+            store = load_store(file_path, args.limit, reuse_store=args.reuse_store)
+            count = store.shape[0] if store is not None else 0
+            num_blocks = (count + args.block_size - 1) // args.block_size
+            print(f"{os.path.basename(run_dir)}: {count} vectors, {num_blocks} block rows")
+            for start, end in plan_shards(num_blocks, args.plan_shards):
+                print(f"  --shard {start}:{end}")
+            continue
+
+        if args.merge:
+            try:
+                acc = merge_partials(file_path, partial_dir)
+            except (ValueError, FileNotFoundError) as e:
+                print(f"❌ {e}")
+                print(f"⛔ Not writing {OUTPUT_FILENAME} for {os.path.basename(run_dir)}")
+                failed = True
+                continue
+            write_result(file_path, acc.to_result(result_filename(file_path)))
+            continue
+
+        acc, check_passed = analyze_file(file_path, args.limit, args.block_size, args.in_memory, args.shard, args.reuse_store, check)
+        if acc is None:
+            print(f"⛔ Not writing {OUTPUT_FILENAME} for {os.path.basename(run_dir)}")
+            failed = True
+            continue
+
+        if args.shard:
+            num_blocks = (acc.num_rows + args.block_size - 1) // args.block_size
+            meta = {
+                "filename": result_filename(file_path),
+                "count": acc.num_rows,
+                "blockSize": args.block_size,
+                "numBlocks": num_blocks,
+                "rowStart": args.shard[0],
+                "rowEnd": args.shard[1],
+                "checkPassed": check_passed,
+            }
+            os.makedirs(partial_dir, exist_ok=True)
+            out_path = partial_path(partial_dir, os.path.basename(run_dir), args.shard)
+            acc.save_partial(out_path, meta)
+            print(f"✅ Saved partial result to: {out_path}")
+            continue
+
+        write_result(file_path, acc.to_result(result_filename(file_path)))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
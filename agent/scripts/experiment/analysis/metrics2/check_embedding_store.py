@@ -0,0 +1,267 @@
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from vector_store import load_store, temp_path
+
+# Consistency check over a run's whole vector store (vectors.npy), meant to
+# catch vectors from different embedding models being mixed before we spend
+# compute on the pairwise analysis. Everything runs in streaming row batches.
+#
+# Checks:
+#   dimension  - store width equals the embedding model's output dimension
+#   norms      - no zero / non-finite vectors, norms clustered around the median
+#   duplicates - identical vectors (64-bit row fingerprints, verified exactly)
+#   probes     - every vector is close to at least one reference probe embedding
+#
+# Reference probes are any vectors.jsonl-format file embedded with the expected
+# model, e.g. the first lines of a run that is known to be good:
+#   head -n 32 <good_run>/vectors.jsonl > reference_probes.jsonl
+# Without probes, two unit-norm models of the same dimension are
+# indistinguishable, so a missing probe file fails the check.
+#
+# Usage: python check_embedding_store.py <data.jsonl> ... [--probes reference_probes.jsonl]
+
+EXPECTED_DIM = 3072  # models/gemini-embedding-001 (see re-embed-scenarios-all.ts)
+DEFAULT_BATCH_SIZE = 8192
+DEFAULT_PROBES_FILENAME = "reference_probes.jsonl"
+REPORT_FILENAME = "embedding_check.json"
+MAX_REPORTED_ROWS = 20
+
+# A single vector from another embedding model already mixes the store, so
+# probe disagreement is not tolerated by default. Norm outliers and exact
+# duplicates can have harmless causes and get a small allowance.
+DEFAULT_THRESHOLDS = {
+    "norm_tolerance": 0.05,
+    "min_probe_similarity": 0.3,
+    "max_outlier_fraction": 0.01,
+    "max_duplicate_fraction": 0.01,
+    "max_probe_disagree_fraction": 0.0,
+}
+
+
+def load_probes(probe_path):
+    probes = []
+    with open(probe_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip() == '':
+                continue
+            vector = json.loads(line).get('vector')
+            if vector:
+                probes.append(vector)
+    if not probes:
+        raise ValueError(f"No probe vectors in {probe_path}")
+    probes = np.array(probes, dtype=np.float64)
+    norms = np.linalg.norm(probes, axis=1, keepdims=True)
+    return probes / np.where(norms > 0, norms, 1.0)
+
+
+def _first_rows(mask, offset=0):
+    return (np.flatnonzero(mask)[:MAX_REPORTED_ROWS] + offset).tolist()
+
+
+def find_duplicate_rows(store, fingerprints, batch_size=DEFAULT_BATCH_SIZE):
+    # Rows sharing a fingerprint are only candidates; each is compared with
+    # the first row of its fingerprint group, in batches, so hash collisions
+    # never count as duplicates. Groups where some candidate differs from the
+    # first row (a real collision) are regrouped by their exact contents.
+    _, first, inverse, counts = np.unique(
+        fingerprints, return_index=True, return_inverse=True, return_counts=True
+    )
+    rows = np.arange(len(fingerprints))
+    candidates = rows[(counts[inverse] > 1) & (rows != first[inverse])]
+
+    duplicates = []
+    collided = []
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        same = np.all(store[batch] == store[first[inverse[batch]]], axis=1)
+        duplicates.append(batch[same])
+        collided.append(inverse[batch[~same]])
+
+    if collided:
+        for group in np.unique(np.concatenate(collided)).tolist():
+            group_rows = np.flatnonzero(inverse == group)
+            _, unique_idx = np.unique(np.asarray(store[group_rows]), axis=0, return_index=True)
+            duplicates.append(np.setdiff1d(group_rows, group_rows[unique_idx]))
+    if not duplicates:
+        return []
+    return np.unique(np.concatenate(duplicates)).tolist()
+
+
+def check_store(store, expected_dim=EXPECTED_DIM, probes=None, batch_size=DEFAULT_BATCH_SIZE,
+                norm_tolerance=DEFAULT_THRESHOLDS["norm_tolerance"],
+                min_probe_similarity=DEFAULT_THRESHOLDS["min_probe_similarity"],
+                max_outlier_fraction=DEFAULT_THRESHOLDS["max_outlier_fraction"],
+                max_duplicate_fraction=DEFAULT_THRESHOLDS["max_duplicate_fraction"],
+                max_probe_disagree_fraction=DEFAULT_THRESHOLDS["max_probe_disagree_fraction"]):
+    count, dim = store.shape
+    failures = []
+    report = {"count": int(count), "dimension": int(dim)}
+
+    if expected_dim and dim != expected_dim:
+        failures.append(f"dimension {dim} != expected {expected_dim}")
+    if probes is not None and probes.shape[1] != dim:
+        failures.append(f"probe dimension {probes.shape[1]} != store dimension {dim}")
+        probes = None
+
+    # Random odd multipliers turn each row's raw bits into a 64-bit fingerprint
+    rng = np.random.default_rng(0)
+    fp_weights = rng.integers(1, 2**63, size=dim, dtype=np.uint64) | np.uint64(1)
+
+    norms = np.empty(count, dtype=np.float64)
+    fingerprints = np.empty(count, dtype=np.uint64)
+    probe_best = np.empty(count, dtype=np.float64) if probes is not None else None
+    non_finite = []
+
+    for start in range(0, count, batch_size):
+        batch = np.asarray(store[start:start + batch_size], dtype=np.float64)
+        end = start + batch.shape[0]
+
+        finite = np.isfinite(batch).all(axis=1)
+        non_finite.extend(_first_rows(~finite, start))
+        batch = np.where(finite[:, None], batch, 0.0)
+
+        batch_norms = np.linalg.norm(batch, axis=1)
+        norms[start:end] = batch_norms
+
+        with np.errstate(over='ignore'):
+            fingerprints[start:end] = (batch.view(np.uint64) * fp_weights).sum(axis=1, dtype=np.uint64)
+
+        if probes is not None:
+            unit = batch / np.where(batch_norms > 0, batch_norms, 1.0)[:, None]
+            probe_best[start:end] = (unit @ probes.T).max(axis=1)
+
+    # --- Norms ---
+    zero = norms == 0
+    valid_norms = norms[~zero]
+    median_norm = float(np.median(valid_norms)) if valid_norms.size > 0 else 0.0
+    outliers = ~zero & (np.abs(norms / (median_norm or 1.0) - 1.0) > norm_tolerance)
+    report["norms"] = {
+        "median": median_norm,
+        "min": float(valid_norms.min()) if valid_norms.size > 0 else 0.0,
+        "max": float(valid_norms.max()) if valid_norms.size > 0 else 0.0,
+        "zeroRows": _first_rows(zero),
+        "nonFiniteRows": non_finite[:MAX_REPORTED_ROWS],
+        "outlierCount": int(outliers.sum()),
+        "outlierRows": _first_rows(outliers),
+    }
+    if non_finite:
+        failures.append(f"{len(non_finite)}+ vectors contain NaN/Inf")
+    if zero.any():
+        failures.append(f"{int(zero.sum())} zero vectors")
+    if outliers.sum() > max_outlier_fraction * count:
+        failures.append(f"{int(outliers.sum())} vectors with norm outside median ±{norm_tolerance:.0%}")
+
+    # --- Duplicates ---
+    duplicates = find_duplicate_rows(store, fingerprints, batch_size)
+    report["duplicates"] = {"count": len(duplicates), "rows": duplicates[:MAX_REPORTED_ROWS]}
+    if len(duplicates) > max_duplicate_fraction * count:
+        failures.append(f"{len(duplicates)} duplicate vectors")
+
+    # --- Probe agreement ---
+    if probe_best is not None:
+        disagree = probe_best < min_probe_similarity
+        report["probes"] = {
+            "probeCount": int(probes.shape[0]),
+            "meanBestSimilarity": float(probe_best.mean()),
+            "minBestSimilarity": float(probe_best.min()),
+            "disagreeCount": int(disagree.sum()),
+            "disagreeRows": _first_rows(disagree),
+        }
+        if disagree.sum() > max_probe_disagree_fraction * count:
+            failures.append(f"{int(disagree.sum())} vectors below {min_probe_similarity} similarity to every probe")
+    else:
+        report["probes"] = None
+
+    report["failures"] = failures
+    report["passed"] = not failures
+    return report
+
+
+def default_probe_path():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_PROBES_FILENAME)
+    return path if os.path.exists(path) else None
+
+
+def add_threshold_arguments(parser):
+    # Shared with analyze_metrics_v2_ooc.py so both scripts check the same way
+    group = parser.add_argument_group('embedding check thresholds')
+    group.add_argument('--norm-tolerance', type=float, default=DEFAULT_THRESHOLDS["norm_tolerance"],
+                       help="allowed relative deviation of a norm from the median")
+    group.add_argument('--min-probe-similarity', type=float, default=DEFAULT_THRESHOLDS["min_probe_similarity"],
+                       help="a vector below this similarity to every probe disagrees")
+    group.add_argument('--max-outlier-fraction', type=float, default=DEFAULT_THRESHOLDS["max_outlier_fraction"],
+                       help="allowed fraction of norm outliers")
+    group.add_argument('--max-duplicate-fraction', type=float, default=DEFAULT_THRESHOLDS["max_duplicate_fraction"],
+                       help="allowed fraction of duplicate vectors")
+    group.add_argument('--max-probe-disagree-fraction', type=float,
+                       default=DEFAULT_THRESHOLDS["max_probe_disagree_fraction"],
+                       help="allowed fraction of vectors disagreeing with every probe (default: none)")
+
+
+def thresholds_from_args(args):
+    return {name: getattr(args, name) for name in DEFAULT_THRESHOLDS}
+
+
+def check_run(file_path, store, probe_path=None, expected_dim=EXPECTED_DIM, thresholds=None):
+    # Runs all checks, saves embedding_check.json next to the run and prints a summary
+    probes = load_probes(probe_path) if probe_path else None
+
+    report = check_store(store, expected_dim=expected_dim, probes=probes, **(thresholds or {}))
+    if probes is None:
+        report["failures"].append(
+            f"no reference probes ({DEFAULT_PROBES_FILENAME} not found); pass --probes or --skip-check"
+        )
+        report["passed"] = False
+
+    # Shard nodes share the run directory, so write under a temp name and rename
+    run_dir = os.path.dirname(os.path.abspath(file_path))
+    report_path = os.path.join(run_dir, REPORT_FILENAME)
+    tmp_path = temp_path(report_path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, report_path)
+
+    if report["passed"]:
+        print(f"  -> Embedding check passed ({report['count']} x {report['dimension']})")
+    else:
+        print(f"❌ Embedding check failed for {os.path.basename(run_dir)}:")
+        for failure in report["failures"]:
+            print(f"   - {failure}")
+        print(f"   Details: {report_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a run's vector store for mixed or drifted embeddings.")
+    parser.add_argument('files', nargs='+', help="data.jsonl files; vectors.jsonl is read from the same directory")
+    parser.add_argument('--probes', default=default_probe_path(), help="reference probe vectors (vectors.jsonl format)")
+    parser.add_argument('--expected-dim', type=int, default=EXPECTED_DIM)
+    parser.add_argument('--limit', type=int, default=0)
+    parser.add_argument('--reuse-store', action='store_true', help="reuse an existing vectors.npy instead of rebuilding")
+    add_threshold_arguments(parser)
+    args = parser.parse_args()
+
+    failed = False
+    for file_path in args.files:
+        print(f"\nChecking: {file_path}")
+        try:
+            store = load_store(file_path, args.limit, reuse_store=args.reuse_store)
+        except ValueError as e:
+            print(f"❌ {e}")
+            failed = True
+            continue
+        if store is None:
+            continue
+        report = check_run(file_path, store, args.probes, args.expected_dim, thresholds_from_args(args))
+        failed = failed or not report["passed"]
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
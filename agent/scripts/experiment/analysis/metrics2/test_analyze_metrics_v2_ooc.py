@@ -0,0 +1,318 @@
+
+import os
+import sys
+import json
+import threading
+import subprocess
+import numpy as np
+import pytest
+
+import analyze_metrics_v2_ooc as ooc
+from vector_store import build_vector_store
+
+# The block schedule must reproduce the in-memory path exactly and the
+# brute-force pair loop of analyze_metrics_v2.ts. Multi-node runs are
+# simulated with shards from --plan-shards running as parallel local
+# processes sharing one --partial-dir; --merge must reproduce the single-node
+# similarity_metrics_v2.json.
+#
+# Usage: python -m pytest test_analyze_metrics_v2_ooc.py
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyze_metrics_v2_ooc.py')
+
+NUM_VECTORS = 1037
+DIM = 16
+BLOCK_SIZE = 100
+NUM_SHARDS = 3
+
+
+def run_script(*args, check=True):
+    result = subprocess.run([sys.executable, SCRIPT, *args], capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise AssertionError(f"{' '.join(args)} failed:\n{result.stdout}\n{result.stderr}")
+    return result
+
+
+def write_vectors(path, vectors):
+    with open(path, 'w', encoding='utf-8') as f:
+        for v in vectors:
+            f.write(json.dumps({"runId": "test", "vector": v.tolist()}) + "\n")
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    # Unit-norm vectors sharing a common direction, like one embedding model
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(NUM_VECTORS, DIM)) + 2.0
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    run = tmp_path / "run"
+    run.mkdir()
+    (run / "data.jsonl").write_text("")
+    write_vectors(run / "vectors.jsonl", vectors)
+    write_vectors(tmp_path / "probes.jsonl", vectors[:8])
+    return run
+
+
+def common_args(run_dir):
+    probes = str(run_dir.parent / "probes.jsonl")
+    return ["--block-size", str(BLOCK_SIZE), "--expected-dim", str(DIM), "--probes", probes]
+
+
+def plan(run_dir):
+    result = run_script("--plan-shards", str(NUM_SHARDS), "--block-size", str(BLOCK_SIZE), str(run_dir / "data.jsonl"))
+    return [line.split()[-1] for line in result.stdout.splitlines() if line.strip().startswith("--shard")]
+
+
+def run_shards(run_dir, partial_dir, shard_specs, extra_args=()):
+    # One process per shard, all started before any is waited on
+    data_path = str(run_dir / "data.jsonl")
+    procs = [
+        subprocess.Popen(
+            [sys.executable, SCRIPT, "--shard", spec, "--partial-dir", str(partial_dir),
+             *common_args(run_dir), *extra_args, data_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        for spec in shard_specs
+    ]
+    for proc in procs:
+        out, err = proc.communicate()
+        assert proc.returncode == 0, f"{out}\n{err}"
+
+
+def load_metrics(run_dir):
+    with open(run_dir / "similarity_metrics_v2.json", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def brute_force_result(vectors):
+    # Pair loop of analyzeFile() in analyze_metrics_v2.ts
+    def cosine(a, b):
+        mag_a, mag_b = np.sqrt(np.dot(a, a)), np.sqrt(np.dot(b, b))
+        if mag_a == 0 or mag_b == 0:
+            return 0.0
+        return float(np.dot(a, b) / (mag_a * mag_b))
+
+    count = len(vectors)
+    similarities = []
+    nearest = []
+    for i in range(count):
+        max_sim = -1
+        for j in range(count):
+            if i == j:
+                continue
+            sim = cosine(vectors[i], vectors[j])
+            if i < j:
+                similarities.append(sim)
+            max_sim = max(max_sim, sim)
+        if max_sim != -1:
+            nearest.append(max_sim)
+
+    sims = np.array(similarities)
+    distribution = [0] * ooc.NUM_BINS
+    for sim in similarities:
+        distribution[min(int(np.floor(max(0.0, sim) * 100)), 99)] += 1
+    return {
+        "count": count,
+        "averageSimilarity": float(sims.mean()),
+        "varianceSimilarity": float(np.square(sims - sims.mean()).mean()),
+        "similarityDistribution": distribution,
+        "nearestNeighborAvg": float(np.mean(nearest)),
+    }
+
+
+@pytest.mark.parametrize("block_size", [1, 16, 37, 64, 150, 500])
+def test_blocked_matches_in_memory_and_brute_force(tmp_path, block_size):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(150, DIM)) + 0.5
+    vectors[10] = 0.0  # zero vector: similarity 0 to everything
+    vectors[20] = vectors[21]  # exact duplicate pair
+    (tmp_path / "data.jsonl").write_text("")
+    write_vectors(tmp_path / "vectors.jsonl", vectors)
+    data_path = str(tmp_path / "data.jsonl")
+
+    ooc_acc, _ = ooc.analyze_file(data_path, 0, block_size)
+    in_memory_acc, _ = ooc.analyze_file(data_path, 0, block_size, in_memory=True)
+    ooc_result = ooc_acc.to_result("run/data.jsonl")
+    assert ooc_result == in_memory_acc.to_result("run/data.jsonl")
+
+    reference = brute_force_result(vectors)
+    assert ooc_result["count"] == reference["count"]
+    assert ooc_result["similarityDistribution"] == reference["similarityDistribution"]
+    assert ooc_result["averageSimilarity"] == pytest.approx(reference["averageSimilarity"], rel=1e-12)
+    assert ooc_result["varianceSimilarity"] == pytest.approx(reference["varianceSimilarity"], rel=1e-9)
+    assert ooc_result["nearestNeighborAvg"] == pytest.approx(reference["nearestNeighborAvg"], rel=1e-12)
+
+
+def run_with_timeout(target, timeout=10):
+    # Runs target in a thread and returns the exception it raised
+    errors = []
+
+    def runner():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_schedule hung"
+    return errors
+
+
+def prefetch_threads():
+    return [t for t in threading.enumerate() if t.name == ooc.BlockPrefetcher.THREAD_NAME]
+
+
+@pytest.fixture
+def schedule_store():
+    rng = np.random.default_rng(2)
+    store = rng.normal(size=(100, DIM))
+    return store, ooc.block_pair_schedule(10)
+
+
+def test_prefetcher_read_error_does_not_hang(monkeypatch, schedule_store):
+    store, schedule = schedule_store
+    read_block = ooc.read_block
+
+    def failing_read_block(store, block_size, index):
+        if index == 3:
+            raise OSError("disk went away")
+        return read_block(store, block_size, index)
+
+    monkeypatch.setattr(ooc, "read_block", failing_read_block)
+    errors = run_with_timeout(lambda: ooc.run_schedule(store, 10, schedule))
+    assert len(errors) == 1 and isinstance(errors[0], OSError)
+    assert not prefetch_threads()
+
+
+def test_prefetcher_stops_when_compute_fails(monkeypatch, schedule_store):
+    store, schedule = schedule_store
+    accumulate = ooc.accumulate_block_pair
+    calls = []
+
+    def failing_accumulate(*args):
+        calls.append(1)
+        if len(calls) == 5:
+            raise MemoryError("out of memory")
+        accumulate(*args)
+
+    monkeypatch.setattr(ooc, "accumulate_block_pair", failing_accumulate)
+    errors = run_with_timeout(lambda: ooc.run_schedule(store, 10, schedule))
+    assert len(errors) == 1 and isinstance(errors[0], MemoryError)
+    assert not prefetch_threads()
+
+
+def test_parallel_shards_merge_to_single_node_result(run_dir, tmp_path):
+    data_path = str(run_dir / "data.jsonl")
+    run_script(*common_args(run_dir), data_path)
+    single = load_metrics(run_dir)
+    os.remove(run_dir / "similarity_metrics_v2.json")
+
+    shard_specs = plan(run_dir)
+    assert len(shard_specs) == NUM_SHARDS
+
+    partial_dir = tmp_path / "partials"
+    run_shards(run_dir, partial_dir, shard_specs)
+    assert len(os.listdir(partial_dir)) == NUM_SHARDS
+
+    run_script("--merge", "--partial-dir", str(partial_dir), data_path)
+    merged = load_metrics(run_dir)
+
+    assert merged["count"] == single["count"] == NUM_VECTORS
+    assert merged["filename"] == single["filename"]
+    assert merged["similarityDistribution"] == single["similarityDistribution"]
+    assert merged["nearestNeighborAvg"] == single["nearestNeighborAvg"]
+    assert merged["averageSimilarity"] == pytest.approx(single["averageSimilarity"], rel=1e-12, abs=1e-12)
+    assert merged["varianceSimilarity"] == pytest.approx(single["varianceSimilarity"], rel=1e-9, abs=1e-12)
+
+
+def test_merge_fails_on_missing_shard(run_dir, tmp_path):
+    shard_specs = plan(run_dir)
+    partial_dir = tmp_path / "partials"
+    run_shards(run_dir, partial_dir, shard_specs[:-1])
+
+    result = run_script("--merge", "--partial-dir", str(partial_dir), str(run_dir / "data.jsonl"), check=False)
+    assert result.returncode != 0
+    assert "missing" in result.stderr + result.stdout
+    assert not (run_dir / "similarity_metrics_v2.json").exists()
+
+
+def test_merge_fails_on_overlapping_shards(run_dir, tmp_path):
+    plan(run_dir)
+    partial_dir = tmp_path / "partials"
+    run_shards(run_dir, partial_dir, ["0:4", "3:11"])
+
+    result = run_script("--merge", "--partial-dir", str(partial_dir), str(run_dir / "data.jsonl"), check=False)
+    assert result.returncode != 0
+    assert "overlap" in result.stderr + result.stdout
+    assert not (run_dir / "similarity_metrics_v2.json").exists()
+
+
+def test_merge_refuses_unchecked_partials(run_dir, tmp_path):
+    shard_specs = plan(run_dir)
+    partial_dir = tmp_path / "partials"
+    run_shards(run_dir, partial_dir, shard_specs, extra_args=["--skip-check"])
+
+    result = run_script("--merge", "--partial-dir", str(partial_dir), str(run_dir / "data.jsonl"), check=False)
+    assert result.returncode != 0
+    assert "embedding check" in result.stdout
+    assert not (run_dir / "similarity_metrics_v2.json").exists()
+
+
+def test_out_of_range_shard_exits_cleanly(run_dir, tmp_path):
+    run_script("--plan-shards", "1", "--block-size", str(BLOCK_SIZE), str(run_dir / "data.jsonl"))
+    result = run_script("--shard", "5:20", "--partial-dir", str(tmp_path / "partials"),
+                        *common_args(run_dir), str(run_dir / "data.jsonl"), check=False)
+    assert result.returncode == 1
+    assert "exceeds" in result.stdout
+    assert "Traceback" not in result.stderr
+
+
+def test_shard_does_not_build_the_store(run_dir, tmp_path):
+    result = run_script("--shard", "0:4", "--partial-dir", str(tmp_path / "partials"),
+                        *common_args(run_dir), str(run_dir / "data.jsonl"), check=False)
+    assert result.returncode == 1
+    assert "--plan-shards" in result.stdout
+    assert not (run_dir / "vectors.npy").exists()
+
+
+def test_merge_ignores_partials_being_written(run_dir, tmp_path):
+    shard_specs = plan(run_dir)
+    partial_dir = tmp_path / "partials"
+    run_shards(run_dir, partial_dir, shard_specs)
+    # A node still writing a duplicate of the first shard
+    first = sorted(os.listdir(partial_dir))[0]
+    (partial_dir / f"{first}.tmp-otherhost-0123.npz").write_bytes(b"")
+
+    run_script("--merge", "--partial-dir", str(partial_dir), str(run_dir / "data.jsonl"))
+    assert load_metrics(run_dir)["count"] == NUM_VECTORS
+
+
+def test_check_passed_reflects_the_check_that_ran(run_dir, tmp_path):
+    data_path = str(run_dir / "data.jsonl")
+    check = {"run": lambda *args: {"passed": True}, "probe_path": None, "expected_dim": DIM, "thresholds": None}
+
+    assert ooc.analyze_file(data_path, 0, BLOCK_SIZE, check=check)[1] is True
+    assert ooc.analyze_file(data_path, 0, BLOCK_SIZE)[1] is False
+
+    # No vectors.jsonl: returns before the check could run
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    acc, check_passed = ooc.analyze_file(str(empty / "data.jsonl"), 0, BLOCK_SIZE, check=check)
+    assert acc.num_rows == 0 and check_passed is False
+
+    partial_dir = tmp_path / "partials"
+    run_shards(run_dir, partial_dir, plan(run_dir))
+    for name in os.listdir(partial_dir):
+        assert ooc.PairwiseAccumulator.load_partial(str(partial_dir / name))[1]["checkPassed"] is True
+
+
+def test_failed_store_build_leaves_no_temp_file(tmp_path):
+    vectors = [np.ones(DIM), np.ones(DIM), np.ones(DIM + 1)]
+    write_vectors(tmp_path / "vectors.jsonl", vectors)
+
+    with pytest.raises(ValueError, match="Dimension mismatch"):
+        build_vector_store(str(tmp_path / "vectors.jsonl"), str(tmp_path / "vectors.npy"))
+    assert sorted(os.listdir(tmp_path)) == ["vectors.jsonl"]
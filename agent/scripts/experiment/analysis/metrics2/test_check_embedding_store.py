@@ -0,0 +1,110 @@
+
+import numpy as np
+import pytest
+
+from check_embedding_store import check_store, find_duplicate_rows
+
+# Unit tests for the embedding store checks on small synthetic stores.
+#
+# Usage: python -m pytest test_check_embedding_store.py
+
+DIM = 16
+COUNT = 2000
+
+
+def unit_rows(rng, count, shift=2.0):
+    # Unit-norm vectors sharing a common direction, like one embedding model
+    vectors = rng.normal(size=(count, DIM)) + shift
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def store(rng):
+    return unit_rows(rng, COUNT)
+
+
+def test_clean_store_passes(store):
+    report = check_store(store, expected_dim=DIM, probes=store[:16], batch_size=300)
+    assert report["passed"], report["failures"]
+    assert report["duplicates"]["count"] == 0
+    assert report["probes"]["disagreeCount"] == 0
+
+
+def test_dimension_mismatch(store):
+    report = check_store(store, expected_dim=DIM + 1)
+    assert not report["passed"]
+    assert any("dimension" in f for f in report["failures"])
+
+
+def test_probe_dimension_mismatch(store):
+    report = check_store(store, expected_dim=DIM, probes=np.ones((4, DIM + 1)))
+    assert not report["passed"]
+    assert report["probes"] is None
+
+
+def test_zero_and_non_finite_rows(store):
+    store = store.copy()
+    store[7] = 0.0
+    store[1500, 3] = np.nan
+    report = check_store(store, expected_dim=DIM, batch_size=300)
+    assert not report["passed"]
+    assert report["norms"]["nonFiniteRows"] == [1500]
+    # The NaN row is zeroed for the norm check, so it counts as zero as well
+    assert report["norms"]["zeroRows"] == [7, 1500]
+
+
+def test_duplicates_above_allowance(store):
+    store = store.copy()
+    store[100:130] = store[0]
+    report = check_store(store, expected_dim=DIM, batch_size=64)
+    assert not report["passed"]
+    assert report["duplicates"]["count"] == 30
+    assert report["duplicates"]["rows"] == list(range(100, 120))
+
+
+def test_single_foreign_row_fails_probe_check(rng, store):
+    # A handful of rows from another "model" (a different dominant direction)
+    store = store.copy()
+    foreign = unit_rows(rng, 10, shift=0.0)
+    foreign[:, :DIM // 2] = -np.abs(foreign[:, :DIM // 2]) - 2.0
+    foreign /= np.linalg.norm(foreign, axis=1, keepdims=True)
+    rows = rng.choice(COUNT, size=10, replace=False)
+    store[rows] = foreign
+
+    report = check_store(store, expected_dim=DIM, probes=store[np.setdiff1d(np.arange(16), rows)])
+    assert not report["passed"]
+    assert report["probes"]["disagreeCount"] == 10
+    assert sorted(report["probes"]["disagreeRows"]) == sorted(rows.tolist())
+
+    # Allowance can be raised explicitly
+    report = check_store(store, expected_dim=DIM, probes=store[np.setdiff1d(np.arange(16), rows)],
+                         max_probe_disagree_fraction=0.01)
+    assert report["passed"], report["failures"]
+
+
+def test_find_duplicate_rows_groups():
+    store = np.arange(40, dtype=np.float64).reshape(10, 4)
+    store[3] = store[1]
+    store[8] = store[1]
+    store[6] = store[5]
+    fingerprints = np.arange(10, dtype=np.uint64)
+    fingerprints[[3, 8]] = fingerprints[1]
+    fingerprints[6] = fingerprints[5]
+    assert find_duplicate_rows(store, fingerprints, batch_size=2) == [3, 6, 8]
+
+
+def test_find_duplicate_rows_ignores_fingerprint_collisions():
+    store = np.arange(40, dtype=np.float64).reshape(10, 4)
+    store[9] = store[2]
+    fingerprints = np.zeros(10, dtype=np.uint64)  # every row collides
+    assert find_duplicate_rows(store, fingerprints, batch_size=3) == [9]
+
+
+def test_find_duplicate_rows_none():
+    store = np.arange(12, dtype=np.float64).reshape(3, 4)
+    assert find_duplicate_rows(store, np.arange(3, dtype=np.uint64)) == []
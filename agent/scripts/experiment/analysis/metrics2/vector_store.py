@@ -0,0 +1,110 @@
+
+import os
+import json
+import uuid
+import socket
+import numpy as np
+
+# Row-major .npy store of a run's vectors.jsonl, shared by
+# analyze_metrics_v2_ooc.py and check_embedding_store.py.
+# Vectors are streamed from the JSONL file twice (count, then write) and never
+# held in memory as a whole.
+
+STORE_FILENAME = "vectors.npy"
+
+
+def temp_path(path):
+    # Temporary name next to path for write-then-rename. The hostname and a
+    # random suffix keep it unique across nodes sharing one filesystem.
+    return f"{path}.tmp-{socket.gethostname()}-{uuid.uuid4().hex}"
+
+
+def build_vector_store(vector_file_path, store_path, limit=0):
+    # Pass 1: count valid lines and detect dimension (no vectors kept in memory)
+    count = 0
+    dim = None
+    with open(vector_file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if limit > 0 and count >= limit:
+                break
+            vector = _parse_vector_line(line)
+            if vector is None:
+                continue
+            if dim is None:
+                dim = len(vector)
+            count += 1
+
+    if count == 0:
+        return None
+
+    # Pass 2: write rows straight into a memory-mapped .npy file.
+    # Written under a temporary name and renamed, so nodes sharing the
+    # experiment directory never open a half-written store.
+    tmp_path = temp_path(store_path)
+    store = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(count, dim))
+    row = 0
+    try:
+        with open(vector_file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if row >= count:
+                    break
+                vector = _parse_vector_line(line)
+                if vector is None:
+                    continue
+                if len(vector) != dim:
+                    raise ValueError(f"Dimension mismatch at row {row}: expected {dim}, got {len(vector)}")
+                store[row] = vector
+                row += 1
+        store.flush()
+    except BaseException:
+        # Don't leave a store-sized temp file behind for every failed attempt
+        del store
+        os.remove(tmp_path)
+        raise
+    del store
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+def _parse_vector_line(line):
+    if line.strip() == '':
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        print("  Skipping invalid vector line")
+        return None
+    vector = record.get('vector')
+    if not vector:
+        return None
+    return vector
+
+
+def open_vector_store(store_path, in_memory=False):
+    if in_memory:
+        return np.load(store_path)
+    return np.load(store_path, mmap_mode='r')
+
+
+def load_store(file_path, limit, in_memory=False, reuse_store=False, build=True):
+    # build=False only opens an existing store (shard nodes must not rebuild
+    # the shared store concurrently) and raises ValueError when there is none.
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    vector_file_path = os.path.join(dir_path, 'vectors.jsonl')
+    store_path = os.path.join(dir_path, STORE_FILENAME)
+
+    if (reuse_store or not build) and os.path.exists(store_path):
+        print(f"  -> Reusing vector store {STORE_FILENAME}")
+    elif not build:
+        raise ValueError(f"{STORE_FILENAME} not found in {dir_path}; build it once with --plan-shards first")
+    else:
+        if not os.path.exists(vector_file_path):
+            print(f"⚠️ vectors.jsonl not found in {dir_path}. Skipping.")
+            return None
+        print(f"  -> Building vector store {STORE_FILENAME}...")
+        if build_vector_store(vector_file_path, store_path, limit) is None:
+            return None
+
+    store = open_vector_store(store_path, in_memory)
+    print(f"  -> Loaded {store.shape[0]} vectors ({'in memory' if in_memory else 'memory-mapped'}).")
+    return store
@@ -0,0 +1,325 @@
+
+import os
+import csv
+import argparse
+import matplotlib.pyplot as plt
+import numpy as np
+
+from experiment_model import (
+    EXPERIMENTS_BASE_DIR,
+    load_experiments,
+    shift_metrics_by_model,
+    significance_marker,
+    normalized_distribution,
+)
+from comparison_matrix import (
+    TIDY_FIELDS,
+    stack_runs,
+    shift_matrices,
+    tidy_rows,
+    plot_matrices,
+)
+
+# Builds every similarity / vocabulary figure and CSV from one pass over the
+# experiment directories. Outputs keep the locations the per-area scripts used:
+#   metrics/figures     - v1 (original embeddings)
+#   metrics2/figures    - v2 (re-embedded)
+#   vocabulary/figures  - vocabulary growth
+#   report/figures      - v1 vs v2 comparison, run x run shift matrices
+#
+# Usage: python build_report.py [--base-dir <experiments>] [--only metrics metrics2 vocabulary comparison matrix]
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VERSION_OUTPUTS = {
+    "v1": {"area": "metrics", "suffix": "", "title": ""},
+    "v2": {"area": "metrics2", "suffix": "_v2", "title": " (Re-Embedded)"},
+}
+
+ALL_OUTPUTS = ["metrics", "metrics2", "vocabulary", "comparison", "matrix"]
+
+SHIFT_FIELDS = ["Model", "Mean_OFF", "Mean_ON", "Mean_Diff", "T_Score", "Cohens_d", "OVL", "Wasserstein"]
+DELTA_METRICS = ["Mean_Diff", "T_Score", "Cohens_d", "OVL", "Wasserstein"]
+
+
+def figures_dir(area):
+    path = os.path.join(ANALYSIS_DIR, area, 'figures')
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+
+# --- Similarity Figures ---
+
+def plot_distribution_grid(model, version, output_path):
+    # 2x2 grid, one panel per model with RAG ON/OFF histograms (line plot)
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    axes = axes.flatten()
+
+    num_bins = 100
+    x_indices = np.arange(num_bins)
+
+    for i, model_name in enumerate(model.model_names[:len(axes)]):
+        ax = axes[i]
+        for state in ["on", "off"]:
+            run = model.run(model_name, state)
+            if run is None or version not in run.metrics:
+                continue
+
+            norm_dist = normalized_distribution(run.metrics[version])
+            ax.plot(x_indices, norm_dist, linewidth=1.5, label=f"RAG {state.upper()}", color=run.color)
+            ax.fill_between(x_indices, norm_dist, alpha=0.1, color=run.color)
+
+        ax.set_title(model_name, fontsize=12, fontweight='bold')
+
+        # Set ticks every 10 bins (0.1 step)
+        tick_positions = np.arange(0, 101, 10)
+        ax.set_xticks(tick_positions)
+        ax.set_xticklabels([f"{p/100:.1f}" for p in tick_positions], fontsize=9)
+        ax.grid(True, linestyle='--', alpha=0.3)
+        ax.legend()
+
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=300)
+    print(f"Grid Chart saved to: {output_path}")
+    plt.close()
+
+
+def plot_similarity_stats(model, version, output_path, title_suffix):
+    plt.figure(figsize=(10, 6))
+
+    stat_labels = []
+    stat_avgs = []
+    stat_colors = []
+    for run in model.iter_runs():
+        if version not in run.metrics:
+            continue
+        stat_labels.append(f"{run.model_name}\n({run.state.upper()})")
+        stat_avgs.append(run.metrics[version]['averageSimilarity'])
+        stat_colors.append(run.color)
+
+    x_pos = np.arange(len(stat_labels))
+    plt.bar(x_pos, stat_avgs, color=stat_colors, alpha=0.8, edgecolor='black', width=0.6)
+
+    plt.ylabel('Average Cosine Similarity', fontsize=12)
+    plt.title(f'Average Similarity by Model & RAG{title_suffix}', fontsize=14)
+    plt.xticks(x_pos, stat_labels, rotation=45, ha='right', fontsize=9)
+    plt.grid(axis='y', linestyle='--', alpha=0.5)
+
+    for i, v in enumerate(stat_avgs):
+        plt.text(i, v + 0.01, f"{v:.3f}", ha='center', fontsize=9)
+
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=300)
+    print(f"Stats Chart saved to: {output_path}")
+    plt.close()
+
+
+def shift_rows(shifts):
+    rows = []
+    for model_name, s in shifts.items():
+        rows.append({
+            "Model": model_name,
+            "Mean_OFF": round(s["mean_off"], 4),
+            "Mean_ON": round(s["mean_on"], 4),
+            "Mean_Diff": round(s["mean_off"] - s["mean_on"], 4),
+            "T_Score": round(s["t_stat"], 4),
+            "Cohens_d": round(s["cohens_d"], 4),
+            "OVL": round(s["ovl"], 4),
+            "Wasserstein": round(s["wasserstein"], 4)
+        })
+    return rows
+
+
+def print_shift_metrics(shifts, title_suffix):
+    print(f"\n--- Shift Metrics Calculation (RAG OFF vs RAG ON){title_suffix} ---")
+    for model_name, s in shifts.items():
+        m1, m2 = s["mean_off"], s["mean_on"]
+        print(f"Model: {model_name}")
+        print(f"  Mean OFF:  {m1:.4f}")
+        print(f"  Mean ON:   {m2:.4f}")
+        print(f"  Diff:      {(m1 - m2):.4f} (OFF - ON)")
+        print(f"  T-Score:   {s['t_stat']:.4f} {significance_marker(s['t_stat'])}")
+        print(f"  Cohen's d: {s['cohens_d']:.4f}")
+        print(f"  OVL:       {s['ovl']:.4f}")
+        print(f"  Wasserstein: {s['wasserstein']:.4f}")
+        print("-" * 30)
+
+
+def write_csv(rows, fieldnames, output_path):
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Metrics Report saved to: {output_path}")
+
+
+def build_similarity_outputs(model, version, shifts):
+    out = VERSION_OUTPUTS[version]
+    out_dir = figures_dir(out["area"])
+    suffix = out["suffix"]
+
+    plot_distribution_grid(model, version, os.path.join(out_dir, f'similarity_distribution_grid{suffix}.png'))
+    plot_similarity_stats(model, version, os.path.join(out_dir, f'similarity_stats{suffix}.png'), out["title"])
+
+    title_suffix = f" -{out['title']}" if out["title"] else ""
+    print_shift_metrics(shifts, title_suffix)
+    write_csv(shift_rows(shifts), SHIFT_FIELDS, os.path.join(out_dir, f'metrics_comparison_report{suffix}.csv'))
+
+
+# --- Vocabulary ---
+
+def plot_vocabulary(model, output_path):
+    plt.figure(figsize=(10, 6))
+
+    plotted = 0
+    for run in model.iter_runs():
+        if run.vocabulary is None:
+            continue
+        steps, words = run.vocabulary
+        # Solid for RAG ON, dotted for RAG OFF
+        linestyle = '-' if run.state == "on" else ':'
+        plt.plot(steps, words, label=run.label, linewidth=2, color=run.color, linestyle=linestyle)
+        plotted += 1
+
+    if plotted == 0:
+        print("No valid files processed.")
+        plt.close()
+        return
+
+    plt.title('Vocabulary Growth: Unique Words vs Generation Steps', fontsize=14)
+    plt.xlabel('Generated Scenarios (Steps)', fontsize=12)
+    plt.ylabel('Cumulative Unique Words', fontsize=12)
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.legend(fontsize=10)
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=300)
+    print(f"Graph saved to: {output_path}")
+    plt.close()
+
+
+# --- v1 vs v2 Comparison ---
+
+def delta_rows(shifts_v1, shifts_v2):
+    # One row per (model, metric): value before and after re-embedding
+    rows_v1 = {row["Model"]: row for row in shift_rows(shifts_v1)}
+    rows_v2 = {row["Model"]: row for row in shift_rows(shifts_v2)}
+    rows = []
+    for model_name in rows_v1:
+        if model_name not in rows_v2:
+            continue
+        for metric in DELTA_METRICS:
+            v1 = rows_v1[model_name][metric]
+            v2 = rows_v2[model_name][metric]
+            rows.append({
+                "Model": model_name,
+                "Metric": metric,
+                "V1": v1,
+                "V2": v2,
+                "Delta": round(v2 - v1, 4),
+            })
+    return rows
+
+
+def plot_delta(rows, output_path):
+    metrics = ["Mean_Diff", "Cohens_d", "OVL", "Wasserstein"]
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    axes = axes.flatten()
+    bar_width = 0.35
+
+    for ax, metric in zip(axes, metrics):
+        metric_rows = [r for r in rows if r["Metric"] == metric]
+        models = [r["Model"] for r in metric_rows]
+        x_pos = np.arange(len(models))
+
+        ax.bar(x_pos - bar_width / 2, [r["V1"] for r in metric_rows], bar_width,
+               label='v1 (original)', color='#999999', edgecolor='black')
+        ax.bar(x_pos + bar_width / 2, [r["V2"] for r in metric_rows], bar_width,
+               label='v2 (re-embedded)', color='#3366cc', edgecolor='black')
+
+        for i, r in enumerate(metric_rows):
+            top = max(r["V1"], r["V2"])
+            ax.text(i, top, f"Δ{r['Delta']:+.3f}", ha='center', va='bottom', fontsize=9)
+
+        ax.set_title(metric, fontsize=12, fontweight='bold')
+        ax.set_xticks(x_pos)
+        ax.set_xticklabels(models, fontsize=9)
+        ax.axhline(0, color='black', linewidth=0.8)
+        ax.grid(axis='y', linestyle='--', alpha=0.5)
+
+    # One legend for the whole figure so it never covers the bars
+    handles, labels = axes[0].get_legend_handles_labels()
+    fig.legend(handles, labels, loc='upper right', ncol=2)
+    plt.suptitle('Shift Metrics (RAG OFF vs RAG ON): Original vs Re-Embedded', fontsize=14)
+    plt.tight_layout(rect=(0, 0, 1, 0.95))
+    plt.savefig(output_path, dpi=300)
+    print(f"Comparison Chart saved to: {output_path}")
+    plt.close()
+
+
+def build_comparison_outputs(shifts_v1, shifts_v2):
+    rows = delta_rows(shifts_v1, shifts_v2)
+    if not rows:
+        print("No model has both v1 and v2 metrics; skipping comparison.")
+        return
+
+    print("\n--- Re-Embedding Effect (V2 - V1) ---")
+    for r in rows:
+        print(f"  {r['Model']:<15} {r['Metric']:<12} {r['V1']:>8.4f} -> {r['V2']:>8.4f} ({r['Delta']:+.4f})")
+
+    out_dir = figures_dir('report')
+    write_csv(rows, ["Model", "Metric", "V1", "V2", "Delta"], os.path.join(out_dir, 'metrics_v1_v2_delta.csv'))
+    plot_delta(rows, os.path.join(out_dir, 'metrics_v1_v2_delta.png'))
+
+
+# --- Run x Run Matrices ---
+
+def build_matrix_outputs(model):
+    out_dir = figures_dir('report')
+    rows = []
+    for version, out in VERSION_OUTPUTS.items():
+        stack = stack_runs(model, version)
+        if stack is None or len(stack["runs"]) < 2:
+            print(f"Not enough runs with {version} metrics; skipping matrix.")
+            continue
+        matrices = shift_matrices(stack)
+        plot_matrices(stack, matrices, os.path.join(out_dir, f'shift_matrix{out["suffix"]}.png'), out["title"])
+        rows.extend(tidy_rows(stack, matrices, version))
+
+    if rows:
+        write_csv(rows, TIDY_FIELDS, os.path.join(out_dir, 'shift_matrix.csv'))
+
+
+# --- Main ---
+
+def build(base_dir=EXPERIMENTS_BASE_DIR, outputs=ALL_OUTPUTS):
+    model = load_experiments(base_dir)
+
+    # Shift metrics for both versions are computed once and shared by all outputs
+    shifts = {version: shift_metrics_by_model(model, version) for version in VERSION_OUTPUTS}
+
+    if "metrics" in outputs:
+        build_similarity_outputs(model, "v1", shifts["v1"])
+    if "metrics2" in outputs:
+        build_similarity_outputs(model, "v2", shifts["v2"])
+    if "vocabulary" in outputs:
+        plot_vocabulary(model, os.path.join(figures_dir('vocabulary'), 'vocabulary_growth_comparison.png'))
+    if "comparison" in outputs:
+        build_comparison_outputs(shifts["v1"], shifts["v2"])
+    if "matrix" in outputs:
+        build_matrix_outputs(model)
+
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build all experiment figures and CSVs from one load.")
+    parser.add_argument('--base-dir', default=EXPERIMENTS_BASE_DIR, help="experiments directory")
+    parser.add_argument('--only', nargs='+', choices=ALL_OUTPUTS, default=ALL_OUTPUTS, help="subset of outputs")
+    args = parser.parse_args()
+
+    build(args.base_dir, args.only)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from experiment_model import NUM_BINS, normalized_distribution
+
+# Shift metrics for every ordered pair of runs (not only RAG OFF vs ON within
+# one model). All runs are stacked into arrays and every R x R matrix is
+# computed with broadcasting in a single pass.
+#
+# Entry [a, b] compares run a (the "OFF" side of shift_metrics) against run b,
+# so [off, on] of one model equals shift_metrics(d_off, d_on).
+
+MATRIX_METRICS = ["Cohens_d", "T_Score", "OVL", "Wasserstein"]
+TIDY_FIELDS = ["Version", "Run_A", "Run_B", "Mean_A", "Mean_B", "Mean_Diff"] + MATRIX_METRICS
+
+
+def run_labels(runs):
+    # "<model> ON/OFF", with the directory timestamp added when two runs collide
+    labels = [f"{run.model_name} {run.state.upper()}" for run in runs]
+    return [
+        f"{label} [{run.dir_name.split('_')[0]}]" if labels.count(label) > 1 else label
+        for label, run in zip(labels, runs)
+    ]
+
+
+def has_distribution(data):
+    # Runs with fewer than 2 vectors are written with an empty distribution
+    dist = data.get('similarityDistribution') or []
+    return len(dist) == NUM_BINS and sum(dist) > 0
+
+
+def stack_runs(model, version):
+    # Every discovered run with usable metrics for this version (grid runs first)
+    runs = []
+    for run in model.all_runs:
+        if version not in run.metrics:
+            continue
+        if not has_distribution(run.metrics[version]):
+            print(f"Warning: {run.dir_name} has no {version} similarity distribution; leaving it out of the matrix")
+            continue
+        runs.append(run)
+    if not runs:
+        return None
+
+    data = [run.metrics[version] for run in runs]
+    return {
+        "runs": runs,
+        "labels": run_labels(runs),
+        "means": np.array([d['averageSimilarity'] for d in data], dtype=np.float64),
+        "variances": np.array([d['varianceSimilarity'] for d in data], dtype=np.float64),
+        "counts": np.array([d['count'] for d in data], dtype=np.float64),
+        "pmfs": np.stack([normalized_distribution(d) for d in data]),
+    }
+
+
+def shift_matrices(stack):
+    m, v, n, pmfs = stack["means"], stack["variances"], stack["counts"], stack["pmfs"]
+
+    # Row index a, column index b
+    m_a, m_b = m[:, None], m[None, :]
+    v_a, v_b = v[:, None], v[None, :]
+    n_a, n_b = n[:, None], n[None, :]
+    mean_diff = m_a - m_b
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled_var = ((n_a - 1) * v_a + (n_b - 1) * v_b) / (n_a + n_b - 2)
+        cohens_d = np.where(mean_diff == 0, 0.0, mean_diff / np.sqrt(pooled_var))
+        t_stat = np.where(mean_diff == 0, 0.0, mean_diff / np.sqrt(v_a / n_a + v_b / n_b))
+
+    # (R, R, bins) intermediates; fine for dozens of runs with 100 bins
+    ovl = np.minimum(pmfs[:, None, :], pmfs[None, :, :]).sum(axis=2)
+    cdfs = np.cumsum(pmfs, axis=1)
+    bin_width = 1.0 / pmfs.shape[1]
+    wasserstein = np.abs(cdfs[:, None, :] - cdfs[None, :, :]).sum(axis=2) * bin_width
+
+    return {
+        "Mean_Diff": mean_diff,
+        "Cohens_d": cohens_d,
+        "T_Score": t_stat,
+        "OVL": ovl,
+        "Wasserstein": wasserstein,
+    }
+
+
+def tidy_rows(stack, matrices, version):
+    # One row per ordered pair (a, b), a != b
+    runs = stack["runs"]
+    r = len(runs)
+    a_idx, b_idx = np.nonzero(~np.eye(r, dtype=bool))
+
+    rows = []
+    for a, b in zip(a_idx.tolist(), b_idx.tolist()):
+        row = {
+            "Version": version,
+            "Run_A": stack["labels"][a],
+            "Run_B": stack["labels"][b],
+            "Mean_A": round(float(stack["means"][a]), 4),
+            "Mean_B": round(float(stack["means"][b]), 4),
+            "Mean_Diff": round(float(matrices["Mean_Diff"][a, b]), 4),
+        }
+        for metric in MATRIX_METRICS:
+            row[metric] = round(float(matrices[metric][a, b]), 4)
+        rows.append(row)
+    return rows
+
+
+def plot_matrices(stack, matrices, output_path, title_suffix):
+    labels = stack["labels"]
+    r = len(labels)
+    annotate = r <= 12
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 14))
+    axes = axes.flatten()
+
+    for ax, metric in zip(axes, MATRIX_METRICS):
+        values = matrices[metric]
+        if metric in ("Cohens_d", "T_Score"):
+            # Signed metrics: diverging colors centered at 0
+            limit = np.nanmax(np.abs(values)) or 1.0
+            im = ax.imshow(values, cmap='coolwarm', vmin=-limit, vmax=limit)
+        else:
+            im = ax.imshow(values, cmap='viridis')
+        fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+
+        ax.set_title(metric, fontsize=12, fontweight='bold')
+        ax.set_xticks(np.arange(r))
+        ax.set_yticks(np.arange(r))
+        ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=8)
+        ax.set_yticklabels(labels, fontsize=8)
+        ax.set_xlabel('Run B')
+        ax.set_ylabel('Run A')
+
+        if annotate:
+            fmt = "{:.3f}" if metric == "Wasserstein" else "{:.2f}"
+            for a in range(r):
+                for b in range(r):
+                    # White on the dark end of the colormap, black on the light end
+                    if metric in ("Cohens_d", "T_Score"):
+                        # coolwarm is dark at both ends and light in the middle
+                        dark = abs(im.norm(values[a, b]) - 0.5) > 0.3
+                    else:
+                        dark = im.norm(values[a, b]) < 0.5
+                    ax.text(b, a, fmt.format(values[a, b]), ha='center', va='center', fontsize=7,
+                            color='white' if dark else 'black')
+
+    plt.suptitle(f'Shift Metrics for Every Run Pair (A vs B){title_suffix}', fontsize=14)
+    plt.tight_layout(rect=(0, 0, 1, 0.97))
+    plt.savefig(output_path, dpi=300)
+    print(f"Matrix Chart saved to: {output_path}")
+    plt.close()
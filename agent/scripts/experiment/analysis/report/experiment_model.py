@@ -0,0 +1,298 @@
+
+import os
+import csv
+import json
+import numpy as np
+
+# Shared in-memory model of the experiment runs used by build_report.py.
+# Every run directory is read exactly once: config.json, both similarity
+# metric versions and vocabulary_growth.csv.
+#
+# MODEL_GROUPS only drives the paired RAG ON/OFF views. Every other non-mock
+# run directory under the experiments folder is discovered as well and shows
+# up in ExperimentModel.all_runs (used by the run x run comparison matrix),
+# labelled with the MODEL_GROUPS display name when its model is known.
+
+# Script: agent/scripts/experiment/analysis/report/experiment_model.py
+# Target: agent/experiments/
+EXPERIMENTS_BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..', 'experiments')
+)
+
+# Define models and their display order in the grid
+MODEL_GROUPS = {
+    "GPT-5.2": {
+        "on": "2026-01-31T11-47-56-129Z_gpt-5.2-2025-12-11_rag_on",
+        "off": "2026-01-31T11-47-56-129Z_gpt-5.2-2025-12-11_rag_off"
+    },
+    "GPT-5 Mini": {
+        "on": "2026-01-31T11-47-56-129Z_gpt-5-mini-2025-08-07_rag_on",
+        "off": "2026-01-31T11-47-56-129Z_gpt-5-mini-2025-08-07_rag_off"
+    },
+    "Gemini 3 Pro": {
+        "on": "2026-01-29T08-30-40-800Z_gemini-3-pro-preview_rag_on",
+        "off": "2026-01-29T08-30-40-796Z_gemini-3-pro-preview_rag_off"
+    },
+    "Gemini 3 Flash": {
+        "on": "2026-01-29T08-30-40-815Z_gemini-3-flash-preview_rag_on",
+        "off": "2026-01-29T08-30-40-799Z_gemini-3-flash-preview_rag_off"
+    }
+}
+
+# Custom color map, keyed by directory name without the timestamp
+COLOR_MAP = {
+    # Gemini 3 Pro
+    "gemini-3-pro-preview_rag_on": "#3333ff",
+    "gemini-3-pro-preview_rag_off": "#000066",
+    # Gemini 3 Flash
+    "gemini-3-flash-preview_rag_on": "#00ff99",
+    "gemini-3-flash-preview_rag_off": "#339966",
+    # GPT 5.2
+    "gpt-5.2-2025-12-11_rag_on": "#ff0000",
+    "gpt-5.2-2025-12-11_rag_off": "#800000",
+    # GPT 5 Mini
+    "gpt-5-mini-2025-08-07_rag_on": "#ffff00",
+    "gpt-5-mini-2025-08-07_rag_off": "#cc9900",
+}
+
+# v1: original embeddings, v2: re-embedded with re-embed-scenarios-all.ts
+METRIC_FILES = {
+    "v1": "similarity_metrics.json",
+    "v2": "similarity_metrics_v2.json",
+}
+
+# Histogram buckets written by both analyzers (0.00-0.01, ..., 0.99-1.00)
+NUM_BINS = 100
+
+STATES = ["on", "off"]
+
+
+def color_key(dir_name):
+    # Format: timestamp_MODEL_rag_STATUS -> MODEL_rag_STATUS
+    parts = dir_name.split('_')
+    if 'rag' not in parts:
+        return None
+    return "_".join(parts[1:])
+
+
+class Run:
+    def __init__(self, dir_name, model_name, state):
+        self.dir_name = dir_name
+        self.model_name = model_name
+        self.state = state
+        self.config = None
+        self.metrics = {}       # version -> similarity metrics JSON
+        self.vocabulary = None  # (steps, unique_words)
+
+    @property
+    def color(self):
+        return COLOR_MAP.get(color_key(self.dir_name), 'gray')
+
+    @property
+    def label(self):
+        # "<model> (RAG ON)" from config.json, falling back to the directory name
+        if self.config is None:
+            return self.dir_name
+        model = self.config.get('model', 'Unknown')
+        rag_status = 'ON' if self.config.get('rag') else 'OFF'
+        return f"{model} (RAG {rag_status})"
+
+
+class ExperimentModel:
+    def __init__(self, model_groups):
+        self.model_groups = model_groups
+        self.runs = {}      # (model_name, state) -> Run, paired grid runs only
+        self.all_runs = []  # grid runs first, then discovered runs by directory name
+
+    @property
+    def model_names(self):
+        return list(self.model_groups.keys())
+
+    def run(self, model_name, state):
+        return self.runs.get((model_name, state))
+
+    def iter_runs(self):
+        # Grid order: each model's RAG ON then RAG OFF
+        for model_name in self.model_names:
+            for state in STATES:
+                run = self.run(model_name, state)
+                if run is not None:
+                    yield run
+
+    def metrics(self, model_name, state, version):
+        run = self.run(model_name, state)
+        if run is None:
+            return None
+        return run.metrics.get(version)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None
+
+
+def _read_vocabulary(path):
+    steps = []
+    words = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                steps.append(int(row['Step']))
+                words.append(int(row['UniqueWords']))
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None
+    return steps, words
+
+
+def _load_run(run_dir, dir_name, model_name, state, warn_missing):
+    run = Run(dir_name, model_name, state)
+
+    config_path = os.path.join(run_dir, 'config.json')
+    if os.path.exists(config_path):
+        run.config = _read_json(config_path)
+
+    for version, filename in METRIC_FILES.items():
+        metrics_path = os.path.join(run_dir, filename)
+        if os.path.exists(metrics_path):
+            data = _read_json(metrics_path)
+            if data is not None:
+                run.metrics[version] = data
+        elif warn_missing:
+            print(f"Warning: File not found {metrics_path}")
+
+    vocabulary_path = os.path.join(run_dir, 'vocabulary_growth.csv')
+    if os.path.exists(vocabulary_path):
+        run.vocabulary = _read_vocabulary(vocabulary_path)
+    elif warn_missing:
+        print(f"Warning: File not found {vocabulary_path}")
+
+    return run
+
+
+def model_display_names(model_groups):
+    # Config model id -> MODEL_GROUPS display name, e.g. gpt-5.2-2025-12-11 -> GPT-5.2
+    names = {}
+    for model_name, group in model_groups.items():
+        for dir_name in group.values():
+            key = color_key(dir_name)
+            if key is not None:
+                names[key.rpartition('_rag_')[0]] = model_name
+    return names
+
+
+def _discovered_identity(run, display_names):
+    # (model_name, state) for a run outside MODEL_GROUPS, from config.json
+    # or else from the directory name (timestamp_MODEL_rag_STATUS)
+    config = run.config
+    if config is not None and 'model' in config:
+        model_id, state = config['model'], "on" if config.get('rag') else "off"
+    else:
+        key = color_key(run.dir_name)
+        if key is None:
+            return run.dir_name, "off"
+        model_id, _, status = key.rpartition('_rag_')
+        state = "on" if status == "on" else "off"
+    return display_names.get(model_id, model_id), state
+
+
+def load_experiments(base_dir=EXPERIMENTS_BASE_DIR, model_groups=MODEL_GROUPS):
+    model = ExperimentModel(model_groups)
+    grid_dirs = set()
+
+    for model_name, group in model_groups.items():
+        for state in STATES:
+            dir_name = group[state]
+            grid_dirs.add(dir_name)
+            run_dir = os.path.join(base_dir, dir_name)
+            if not os.path.isdir(run_dir):
+                print(f"Warning: Directory not found {run_dir}")
+                continue
+
+            run = _load_run(run_dir, dir_name, model_name, state, warn_missing=True)
+            model.runs[(model_name, state)] = run
+            model.all_runs.append(run)
+
+    # Every other run directory (anything with config.json or metrics),
+    # except mock runs, which never called a real model
+    display_names = model_display_names(model_groups)
+    known_files = ['config.json'] + list(METRIC_FILES.values())
+    dir_names = sorted(os.listdir(base_dir)) if os.path.isdir(base_dir) else []
+    for dir_name in dir_names:
+        run_dir = os.path.join(base_dir, dir_name)
+        if dir_name in grid_dirs or not os.path.isdir(run_dir):
+            continue
+        if not any(os.path.exists(os.path.join(run_dir, f)) for f in known_files):
+            continue
+
+        run = _load_run(run_dir, dir_name, None, None, warn_missing=False)
+        if run.config is not None and run.config.get('mock'):
+            continue
+        run.model_name, run.state = _discovered_identity(run, display_names)
+        model.all_runs.append(run)
+
+    return model
+
+
+# --- Shift Metrics ---
+
+def normalized_distribution(data):
+    dist = np.array(data['similarityDistribution'], dtype=np.float64)
+    total = np.sum(dist)
+    return dist / total if total > 0 else dist
+
+
+def shift_metrics(d_off, d_on):
+    # RAG OFF (1) vs RAG ON (2). Positive d means OFF > ON (ON shifted left).
+    m1, v1, n1 = d_off['averageSimilarity'], d_off['varianceSimilarity'], d_off['count']
+    m2, v2, n2 = d_on['averageSimilarity'], d_on['varianceSimilarity'], d_on['count']
+
+    # Cohen's d with pooled standard deviation
+    pooled_var = ((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2)
+    cohens_d = (m1 - m2) / np.sqrt(pooled_var)
+
+    # Welch's t (manual calculation as scipy might be missing)
+    t_stat = (m1 - m2) / np.sqrt(v1 / n1 + v2 / n2)
+
+    # OVL = sum(min(p_i, q_i)) over the normalized histograms
+    pmf_off = normalized_distribution(d_off)
+    pmf_on = normalized_distribution(d_on)
+    ovl = np.sum(np.minimum(pmf_off, pmf_on))
+
+    # 1D Wasserstein: W = sum(|CDF_off - CDF_on|) * bin_width
+    bin_width = 1.0 / len(pmf_off)
+    wasserstein_dist = np.sum(np.abs(np.cumsum(pmf_off) - np.cumsum(pmf_on))) * bin_width
+
+    return {
+        "mean_off": m1,
+        "mean_on": m2,
+        "t_stat": t_stat,
+        "cohens_d": cohens_d,
+        "ovl": ovl,
+        "wasserstein": wasserstein_dist,
+    }
+
+
+def significance_marker(t_stat):
+    # Approximate for large N
+    if abs(t_stat) > 2.58:
+        return "**"  # p < 0.01
+    if abs(t_stat) > 1.96:
+        return "*"   # p < 0.05
+    return ""
+
+
+def shift_metrics_by_model(model, version):
+    # model_name -> shift metrics for every model with both runs available
+    results = {}
+    for model_name in model.model_names:
+        d_on = model.metrics(model_name, "on", version)
+        d_off = model.metrics(model_name, "off", version)
+        if d_on is not None and d_off is not None:
+            results[model_name] = shift_metrics(d_off, d_on)
+    return results
@@ -0,0 +1,95 @@
+
+import json
+import numpy as np
+
+from experiment_model import NUM_BINS, load_experiments
+from comparison_matrix import shift_matrices, stack_runs
+
+# Run x run matrices over a synthetic experiments folder.
+#
+# Usage: python -m pytest test_comparison_matrix.py
+
+
+def write_run(base_dir, dir_name, metrics, config=None):
+    run_dir = base_dir / dir_name
+    run_dir.mkdir()
+    if config is not None:
+        (run_dir / "config.json").write_text(json.dumps(config))
+    (run_dir / "similarity_metrics_v2.json").write_text(json.dumps(metrics))
+
+
+def metrics(mean, peak):
+    dist = [0] * NUM_BINS
+    dist[peak] = 90
+    dist[peak + 1] = 10
+    return {
+        "count": 100,
+        "averageSimilarity": mean,
+        "varianceSimilarity": 0.01,
+        "similarityDistribution": dist,
+        "nearestNeighborAvg": mean + 0.1,
+    }
+
+
+def test_runs_without_distribution_are_left_out(tmp_path, capsys):
+    write_run(tmp_path, "2026-02-01T00-00-00-000Z_model-a_rag_on", metrics(0.6, 60),
+              {"model": "model-a", "rag": True})
+    write_run(tmp_path, "2026-02-01T00-00-00-000Z_model-a_rag_off", metrics(0.7, 70),
+              {"model": "model-a", "rag": False})
+    # What both analyzers write for a run with fewer than 2 vectors
+    write_run(tmp_path, "2026-02-02T00-00-00-000Z_model-b_rag_on", {
+        "count": 1, "averageSimilarity": 0, "varianceSimilarity": 0,
+        "similarityDistribution": [], "nearestNeighborAvg": 0,
+    }, {"model": "model-b", "rag": True})
+
+    model = load_experiments(str(tmp_path), model_groups={})
+    assert len(model.all_runs) == 3
+
+    stack = stack_runs(model, "v2")
+    assert [run.dir_name for run in stack["runs"]] == [
+        "2026-02-01T00-00-00-000Z_model-a_rag_off",
+        "2026-02-01T00-00-00-000Z_model-a_rag_on",
+    ]
+    assert "model-b_rag_on" in capsys.readouterr().out
+
+    matrices = shift_matrices(stack)
+    assert matrices["OVL"].shape == (2, 2)
+    assert np.allclose(np.diag(matrices["OVL"]), 1.0)
+    assert matrices["Cohens_d"][0, 1] > 0
+
+
+def test_no_usable_runs(tmp_path):
+    write_run(tmp_path, "2026-02-02T00-00-00-000Z_model-b_rag_on", {
+        "count": 0, "averageSimilarity": 0, "varianceSimilarity": 0,
+        "similarityDistribution": [], "nearestNeighborAvg": 0,
+    })
+    model = load_experiments(str(tmp_path), model_groups={})
+    assert stack_runs(model, "v2") is None
+
+
+def test_discovered_runs_use_grid_names_and_skip_mocks(tmp_path):
+    groups = {"Model A": {
+        "on": "2026-02-01T00-00-00-000Z_model-a-2026-01-01_rag_on",
+        "off": "2026-02-01T00-00-00-000Z_model-a-2026-01-01_rag_off",
+    }}
+    for state, peak in (("on", 60), ("off", 70)):
+        write_run(tmp_path, groups["Model A"][state], metrics(peak / 100, peak),
+                  {"model": "model-a-2026-01-01", "rag": state == "on"})
+    # A rerun of the same model outside the grid, one without config.json, and a mock run
+    write_run(tmp_path, "2026-03-01T00-00-00-000Z_model-a-2026-01-01_rag_on", metrics(0.65, 65),
+              {"model": "model-a-2026-01-01", "rag": True, "mock": False})
+    write_run(tmp_path, "2026-03-02T00-00-00-000Z_model-a-2026-01-01_rag_off", metrics(0.75, 75))
+    write_run(tmp_path, "2026-03-03T00-00-00-000Z_model-a-2026-01-01_rag_on", metrics(0.5, 50),
+              {"model": "model-a-2026-01-01", "rag": True, "mock": True})
+
+    model = load_experiments(str(tmp_path), model_groups=groups)
+    assert len(model.all_runs) == 4
+    assert {run.model_name for run in model.all_runs} == {"Model A"}
+
+    stack = stack_runs(model, "v2")
+    assert stack["labels"] == [
+        "Model A ON [2026-02-01T00-00-00-000Z]",
+        "Model A OFF [2026-02-01T00-00-00-000Z]",
+        "Model A ON [2026-03-01T00-00-00-000Z]",
+        "Model A OFF [2026-03-02T00-00-00-000Z]",
+    ]